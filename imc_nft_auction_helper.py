@@ -5,26 +5,89 @@ Focus: Budget-aware scarcity-driven utility scoring without sabotage logic
 Author: ChatGPT (Aaron Edition)
 """
 
+import os
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 
 # =============== CONFIGURATION ===============
 STARTING_BUDGET = 50
+MAX_PLAYERS = 20
 MANDATORY_BACKGROUNDS = ["Blue", "Aquamarine", "Yellow"]
 GOLD_BONUS_MULTIPLIER = 1.2  # <= Adjustable in sidebar
+DATA_FILE = "NFT_Auction_Data.xlsx"
+DATA_CACHE = "NFT_Auction_Data.parquet"  # Columnar copy of DATA_FILE, written on first load
 
 # =============== LOAD DATA ===============
-@st.cache_data
-def load_data():
-    df = pd.read_excel("NFT_Auction_Data.xlsx")
+def data_version():
+    return os.path.getmtime(DATA_FILE) if os.path.exists(DATA_FILE) else 0.0
+
+def read_sheet():
+    df = pd.read_excel(DATA_FILE)
     if "Total Score" not in df.columns:
         cols = [c for c in df.columns if "Rarity" in c and "Total" not in c]
-        df["Total Score"] = (1 / df[cols]).sum(axis=1)
+        rarities = df[cols].to_numpy(dtype=float)
+        np.reciprocal(rarities, out=rarities)
+        df["Total Score"] = np.nansum(rarities, axis=1)
+    # Write beside the cache and rename, so a killed process never leaves a truncated DATA_CACHE
+    tmp = f"{DATA_CACHE}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp)
+        os.replace(tmp, DATA_CACHE)
+    except Exception:
+        # Read-only checkout, or a column pyarrow can't store: keep serving from Excel
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
     return df
 
-df = load_data()
-ALL_GOLD = set(df[df['Fur'] == 'Solid Gold']['id'])
+# version is the cache key: editing DATA_FILE invalidates both this cache and DATA_CACHE.
+# Every cached function below that reads df or its arrays takes it too, so none outlive the data.
+@st.cache_data
+def load_data(version):
+    df = None
+    if os.path.exists(DATA_CACHE) and os.path.getmtime(DATA_CACHE) >= version:
+        try:
+            df = pd.read_parquet(DATA_CACHE)
+        except Exception:
+            pass  # Unreadable cache: rebuild it from the sheet
+    if df is None:
+        df = read_sheet()
+    for col in ("Background", "Fur"):
+        df[col] = df[col].astype("category")
+    return df
+
+@st.cache_data
+def load_id_index(version):
+    return {int(i): k for k, i in enumerate(load_data(version)['id'].to_numpy())}
+
+def category_mask(df, col, value):
+    # A value the sheet doesn't contain matches no rows rather than raising
+    cats = df[col].cat.categories
+    if value not in cats:
+        return np.zeros(len(df), dtype=bool)
+    return df[col].cat.codes.to_numpy() == cats.get_loc(value)
+
+# Column arrays for the bid hot path, built once per data version rather than per rerun
+@st.cache_data
+def load_columns(version):
+    df = load_data(version)
+    ts = df['Total Score'].to_numpy(dtype=np.float32)
+    scored = ~np.isnan(ts)  # Blank Total Score cells; pandas' max() used to skip them
+    bg_masks = {bg: category_mask(df, 'Background', bg) for bg in MANDATORY_BACKGROUNDS}
+    # One bit per mandatory background, 0 for every other background
+    bg_bit = np.zeros(len(df), dtype=np.uint8)
+    for i, bg in enumerate(MANDATORY_BACKGROUNDS):
+        bg_bit[bg_masks[bg]] = 1 << i
+    is_gold = category_mask(df, 'Fur', 'Solid Gold')
+    return ts, scored, bg_masks, bg_bit, is_gold
+
+DATA_VERSION = data_version()
+df = load_data(DATA_VERSION)
+TS, SCORED, BG_MASKS, BG_BIT, IS_GOLD = load_columns(DATA_VERSION)
+ID_TO_IDX = load_id_index(DATA_VERSION)
 
 # =============== SESSION STATE ===============
 S = st.session_state
@@ -34,135 +97,162 @@ if "num_players" not in S:
     S.num_players = 13
 if "auctioned_ids" not in S:
     S.auctioned_ids = set()
+if "current_token" not in S:
+    S.current_token = ""
 
 # =============== HELPERS ===============
-def remaining_df():
-    return df[~df['id'].isin(S.auctioned_ids)]
-
-def tokens_of(player):
-    return df[df['id'].isin(S.players[player]['tokens'])]
-
-def has_gold(player):
-    return any(t in ALL_GOLD for t in S.players[player]['tokens'])
-
-def missing_bgs(player):
-    owned = set(tokens_of(player)['Background'])
-    return [bg for bg in MANDATORY_BACKGROUNDS if bg not in owned]
-
-def total_score(player):
-    owned = tokens_of(player)
-    best_scores = []
-    used_ids = set()
-    for bg in MANDATORY_BACKGROUNDS:
-        match = owned[(owned['Background'] == bg) & (~owned['id'].isin(used_ids))]
-        if not match.empty:
-            row = match.sort_values('Total Score', ascending=False).iloc[0]
-            best_scores.append(row['Total Score'])
-            used_ids.add(row['id'])
-
-    golds = owned[(owned['Fur'] == 'Solid Gold') & (~owned['id'].isin(used_ids))]
+def rows_of(ids):
+    return sorted({ID_TO_IDX[i] for i in ids if i in ID_TO_IDX})
+
+def category_scores(cat, alive):
+    mask = IS_GOLD if cat == "Gold" else BG_MASKS[cat]
+    return TS[alive & mask & SCORED]
+
+# Keyed on the sold set (and data version) only, so widget reruns reuse the last result
+@st.cache_data
+def supply(version, sold_key):
+    alive = np.ones(len(df), dtype=bool)
+    alive[rows_of(sold_key)] = False
+    by_cat = {}
+    for cat in MANDATORY_BACKGROUNDS + ["Gold"]:
+        scores = category_scores(cat, alive)
+        by_cat[cat] = scores.max() if scores.size else 0.01
+    return alive, by_cat
+
+@st.cache_data
+def sorted_remaining(version, sold_key):
+    rows = np.flatnonzero(supply(version, sold_key)[0])
+    rows = rows[np.argsort(-df['Total Score'].to_numpy()[rows])]
+    # Rows and columns in one indexer, so only the result is copied
+    return df.iloc[rows, df.columns.get_indexer(['id', 'Background', 'Fur', 'Total Score'])]
+
+def _players_fingerprint(players):
+    return tuple((p, players[p]['budget'], tuple(sorted(players[p]['tokens']))) for p in players)
+
+@st.cache_data
+def collection_state(version, tokens):
+    rows = rows_of(tokens)
+    owned = df.iloc[rows]
+    gold = IS_GOLD[rows]
+    missing_mask = ((1 << len(MANDATORY_BACKGROUNDS)) - 1) & ~int(np.bitwise_or.reduce(BG_BIT[rows], initial=0))
+    missing = [bg for i, bg in enumerate(MANDATORY_BACKGROUNDS) if missing_mask >> i & 1]
+    by_bg = owned.groupby('Background', observed=True)['Total Score']
+    best_by_bg = by_bg.max().to_dict()
+    # A gold token already counted as its background's best can't also be the wildcard
+    best_rows = by_bg.idxmax()
+    used = [best_rows[bg] for bg in MANDATORY_BACKGROUNDS if bg in best_rows.index]
+    golds = owned.loc[gold & ~owned.index.isin(used), 'Total Score']
+    best_scores = [best_by_bg[bg] for bg in MANDATORY_BACKGROUNDS if bg in best_by_bg]
     if not golds.empty:
-        gold_row = golds.sort_values('Total Score', ascending=False).iloc[0]
-        best_scores.append(gold_row['Total Score'])
-        used_ids.add(gold_row['id'])
+        best_scores.append(golds.max())
+    score = round(sum(best_scores), 2)
+    return missing, missing_mask, bool(gold.any()), score
 
-    return round(sum(best_scores), 2)
+@st.cache_data
+def player_states(version, fingerprint):
+    state = {}
+    for p, budget, tokens in fingerprint:
+        missing, missing_mask, gold, score = collection_state(version, tokens)
+        state[p] = {
+            "budget": budget,
+            "missing_bgs": missing,
+            "missing_mask": missing_mask,
+            "has_gold": gold,
+            "score": score,
+        }
+    return state
 
 # =============== SCARCITY TRACKING ===============
-def category_scarcity():
-    rem = remaining_df()
-    bg_demand = {bg: 0 for bg in MANDATORY_BACKGROUNDS + ["Gold"]}
-    for p in S.players:
-        for bg in missing_bgs(p):
-            bg_demand[bg] += 1
-        if not has_gold(p):
-            bg_demand["Gold"] += 1
-    return bg_demand
+@st.cache_data
+def category_scarcity(version, fingerprint):
+    state = player_states(version, fingerprint)
+    # One row per player: which mandatory backgrounds (and gold) they still need
+    needs = np.array([
+        [state[p]['missing_mask'] >> i & 1 for i in range(len(MANDATORY_BACKGROUNDS))] + [not state[p]['has_gold']]
+        for p, _, _ in fingerprint
+    ], dtype=bool)
+    return dict(zip(MANDATORY_BACKGROUNDS + ["Gold"], needs.sum(axis=0).tolist()))
+
+# Same for every player, so computed once per bid table rather than per bid
+def category_tops(version, sold_key, gold_multiplier):
+    tops = supply(version, sold_key)[1]
+    return {cat: top * gold_multiplier if cat == "Gold" else top for cat, top in tops.items()}
 
 # =============== BID LOGIC ===============
-def calculate_bid(token, player):
-    rem = remaining_df()
-    budget = S.players[player]['budget']
+def calculate_bid(idx, player_state, tops, gold_multiplier):
+    budget = player_state['budget']
     if budget <= 0:
         return 0.0
 
-    missing = missing_bgs(player)
-    needs_gold = not has_gold(player)
+    missing = player_state['missing_bgs']
+    needs_gold = not player_state['has_gold']
     slots_left = len(missing) + (1 if needs_gold else 0)
 
     if slots_left == 0:
         return 0.0
 
-    bg = token['Background']
-    fur = token['Fur']
-    rarity = token['Total Score']
+    rarity = TS[idx]
 
-    contributes_bg = bg in missing
-    contributes_gold = fur == 'Solid Gold' and needs_gold
+    contributes_bg = bool(BG_BIT[idx] & player_state['missing_mask'])
+    contributes_gold = IS_GOLD[idx] and needs_gold
 
     if not contributes_bg and not contributes_gold:
         return 0.0
 
-    scarcity = category_scarcity()
-
-    categories_needed = []
-    total_needed_rarity = 0
-
-    if contributes_bg:
-        categories_needed.append(bg)
-    if contributes_gold:
-        categories_needed.append("Gold")
-
-    for need in missing:
-        top_bg = rem[rem['Background'] == need]
-        top_score = top_bg['Total Score'].max() if not top_bg.empty else 0.01
-        total_needed_rarity += top_score
+    total_needed_rarity = sum(tops[need] for need in missing)
     if needs_gold:
-        golds = rem[rem['Fur'] == 'Solid Gold']
-        gold_score = golds['Total Score'].max() if not golds.empty else 0.01
-        total_needed_rarity += gold_score * GOLD_BONUS_MULTIPLIER
-
-    all_factors = []
-    for cat in categories_needed:
-        if cat == "Gold":
-            cat_tokens = rem[rem['Fur'] == 'Solid Gold']
-        else:
-            cat_tokens = rem[rem['Background'] == cat]
-        demand = scarcity.get(cat, 1)
-        top_rarities = cat_tokens.sort_values('Total Score', ascending=False).head(demand)['Total Score'].tolist()
-        if len(top_rarities) <= 1:
-            scarcity_factor = 1.5
-        else:
-            scarcity_factor = 1 + (top_rarities[0] - top_rarities[-1]) / (top_rarities[0] + 1e-6)
-        top_score = cat_tokens['Total Score'].max() if not cat_tokens.empty else 0.01
-        if cat == "Gold":
-            top_score *= GOLD_BONUS_MULTIPLIER
-        all_factors.append((scarcity_factor, top_score))
-
-    combined_score = rarity * (GOLD_BONUS_MULTIPLIER if contributes_gold else 1)
+        total_needed_rarity += tops["Gold"]
+
+    combined_score = rarity * (gold_multiplier if contributes_gold else 1)
     budget_fraction = combined_score / total_needed_rarity if total_needed_rarity > 0 else 0.3
 
     if slots_left == 1:
-        return round(budget, 1)
+        return budget
 
     bid = min(budget, budget * budget_fraction)
-    return round(bid, 1)
+    return int(bid * 10 + 0.5) / 10
+
+# Arguments are the cache key, and everything calculate_bid reads is derived from them
+@st.cache_data
+def bid_table(version, tid, fingerprint, sold_key, gold_multiplier):
+    idx = ID_TO_IDX[tid]
+    state = player_states(version, fingerprint)
+    tops = category_tops(version, sold_key, gold_multiplier)
+    bids = {p: calculate_bid(idx, state[p], tops, gold_multiplier) for p, _, _ in fingerprint}
+    return pd.DataFrame.from_dict(bids, orient='index', columns=['Max Bid ($)'])
+
+@st.cache_data
+def overview_table(version, fingerprint):
+    state = player_states(version, fingerprint)
+    players = [p for p, _, _ in fingerprint]
+    return pd.DataFrame({
+        "Budget": [state[p]['budget'] for p in players],
+        **{bg: ["❌" if state[p]['missing_mask'] >> i & 1 else "✅" for p in players]
+           for i, bg in enumerate(MANDATORY_BACKGROUNDS)},
+        "Gold": ["✅" if state[p]['has_gold'] else "❌" for p in players],
+        "Score": [state[p]['score'] for p in players],
+    }, index=pd.Index(players, name="Player"))
+
+# Everything derived from S.players; called again after the Log Token form changes it
+def refresh_state():
+    fingerprint = _players_fingerprint(S.players)
+    return fingerprint, category_scarcity(DATA_VERSION, fingerprint)
 
 # =============== SIDEBAR CONFIG ===============
 st.sidebar.title("Game Setup")
-S.num_players = st.sidebar.number_input("Players incl. you", 2, 20, value=S.num_players)
+S.num_players = st.sidebar.number_input("Players incl. you", 2, MAX_PLAYERS, value=S.num_players)
 for i in range(1, S.num_players + 1):
     S.players.setdefault(f"Player {i}", {"budget": STARTING_BUDGET, "tokens": []})
+FINGERPRINT, DEMAND = refresh_state()
 
 # Allow adjustment of Gold bonus multiplier
 GOLD_BONUS_MULTIPLIER = st.sidebar.slider("Gold Bonus Multiplier", 1.0, 3.0, GOLD_BONUS_MULTIPLIER, 0.1)
 
 # Display value of Wildcard (Gold) token for Player 1
-tokens = tokens_of("Player 1")
-available_gold = tokens[tokens['Fur'] == 'Solid Gold']
-available_gold = available_gold[~available_gold['id'].isin(tokens[tokens['Background'].isin([bg for bg in MANDATORY_BACKGROUNDS])]['id'])]
-if not available_gold.empty:
-    wildcard_score = available_gold['Total Score'].max()
+rows = rows_of(S.players["Player 1"]['tokens'])
+available_gold = TS[rows][IS_GOLD[rows] & (BG_BIT[rows] == 0) & SCORED[rows]]
+if available_gold.size:
+    wildcard_score = available_gold.max()
     st.sidebar.metric("Wildcard (Gold) Value", f"{wildcard_score:.2f}")
 
 # =============== MAIN TABS ===============
@@ -170,18 +260,19 @@ auction_tab, browse_tab = st.tabs(["🎯 Auction Mode", "📦 Token Overview"])
 
 with auction_tab:
     st.title("Live Auction Tracker")
-    token_id = st.text_input("Current Token ID")
+    # Only a submitted lookup changes the token, so editing the box doesn't rerun the bid table
+    with st.form("🔎 Token Lookup"):
+        st.text_input("Current Token ID", key="token_input")
+        if st.form_submit_button("Look Up"):
+            S.current_token = S.token_input
+    token_id = S.current_token
     if token_id:
         try:
             tid = int(token_id)
-            token = df[df['id'] == tid].iloc[0]
+            token = df.iloc[ID_TO_IDX[tid]]
             st.subheader("Token Info")
             st.json(token[['Background', 'Fur', 'Total Score']].to_dict())
-            bids = {
-                p: calculate_bid(token, p)
-                for p in S.players
-            }
-            bid_df = pd.DataFrame.from_dict(bids, orient='index', columns=['Max Bid ($)'])
+            bid_df = bid_table(DATA_VERSION, tid, FINGERPRINT, frozenset(S.auctioned_ids), GOLD_BONUS_MULTIPLIER)
             st.subheader("Suggested Bids")
             st.dataframe(bid_df)
         except:
@@ -198,27 +289,21 @@ with auction_tab:
                 S.auctioned_ids.add(sid)
                 S.players[buyer]['tokens'].append(sid)
                 S.players[buyer]['budget'] -= price
+                FINGERPRINT, DEMAND = refresh_state()
                 st.success(f"Token {sid} added to {buyer} for ${price}")
             except:
                 st.error("Invalid ID")
 
     st.divider()
     st.subheader("Player Overview")
-    matrix = pd.DataFrame([{
-        "Player": p,
-        "Budget": S.players[p]['budget'],
-        **{bg: "✅" if bg not in missing_bgs(p) else "❌" for bg in MANDATORY_BACKGROUNDS},
-        "Gold": "✅" if has_gold(p) else "❌",
-        "Score": total_score(p)
-    } for p in S.players])
-    st.dataframe(matrix.set_index("Player"))
+    st.dataframe(overview_table(DATA_VERSION, FINGERPRINT))
 
     st.subheader("Category Demand Tracker")
-    st.write(category_scarcity())
+    st.write(DEMAND)
 
 with browse_tab:
     st.title("Remaining Tokens")
-    rem = remaining_df()
+    rem = sorted_remaining(DATA_VERSION, frozenset(S.auctioned_ids))
     col1, col2 = st.columns(2)
     with col1:
         bgs = st.multiselect("Filter Backgrounds", options=["All"] + MANDATORY_BACKGROUNDS, default=["All"])
@@ -228,4 +313,4 @@ with browse_tab:
         if st.checkbox("Gold Only"):
             rem = rem[rem['Fur'] == 'Solid Gold']
 
-    st.dataframe(rem[['id', 'Background', 'Fur', 'Total Score']].sort_values('Total Score', ascending=False))
+    st.dataframe(rem)